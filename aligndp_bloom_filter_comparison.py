@@ -1,79 +1,136 @@
 import numpy as np
 import collections
-import random
 import hashlib
-from bitarray import bitarray
-from typing import List, Dict, Any
+import mmh3
+from numba import njit
+from typing import List, Dict, Any, Tuple
+
+# A single modern PCG64 generator shared by the whole module.
+_RNG = np.random.default_rng()
 
 # --- Helper Classes and Functions ---
 
-class UserFeedback:
-    """Represents a single user feedback event."""
-    def __init__(self, prompt: str, response: str, feedback: str):
-        self.prompt = prompt
-        self.response = response
-        self.feedback = feedback
+@njit(cache=True)
+def _block_mask(h2, k):
+    """Builds the k-bit mask set by an item inside its 64-bit block."""
+    # An odd step visits distinct bit positions within the block.
+    step = (h2 >> np.uint64(6)) | np.uint64(1)
+    mask = np.uint64(0)
+    for i in range(k):
+        mask |= np.uint64(1) << ((h2 + np.uint64(i) * step) & np.uint64(63))
+    return mask
+
+@njit(cache=True)
+def bloom_add(blocks, h1, h2, k):
+    """Sets the bits of one item in a block Bloom filter."""
+    blocks[h1 % np.uint64(blocks.size)] |= _block_mask(h2, k)
+
+@njit(cache=True)
+def bloom_add_many(blocks, h1s, h2s, k):
+    """Sets the bits of a stream of items in a block Bloom filter."""
+    for j in range(h1s.size):
+        blocks[h1s[j] % np.uint64(blocks.size)] |= _block_mask(h2s[j], k)
+
+@njit(cache=True)
+def bloom_check(blocks, h1, h2, k):
+    """Checks whether one item is possibly in a block Bloom filter."""
+    block = blocks[h1 % np.uint64(blocks.size)]
+    step = (h2 >> np.uint64(6)) | np.uint64(1)
+    # Derive bit positions on demand so a missing bit rejects early.
+    for i in range(k):
+        bit = np.uint64(1) << ((h2 + np.uint64(i) * step) & np.uint64(63))
+        if not (block & bit):
+            return False
+    return True
 
 class BloomFilter:
-    """A simple implementation of a Bloom filter."""
-    def __init__(self, size: int, hash_count: int):
+    """
+    A simple block Bloom filter.
+    Each item maps to a single 64-bit block and sets hash_count bits inside it.
+    Set crypto_hash to derive the base hashes from BLAKE2b instead of MurmurHash3.
+    """
+    def __init__(self, size: int, hash_count: int, crypto_hash: bool = False):
         self.size = size
         self.hash_count = hash_count
-        self.bit_array = bitarray(self.size)
-        self.bit_array.setall(0)
+        self.crypto_hash = crypto_hash
+        # Round up so the filter never holds fewer bits than requested.
+        self.blocks = np.zeros(max(1, -(-size // 64)), dtype=np.uint64)
 
     def _hashes(self, item: str):
-        """Generates multiple hash values for an item."""
-        hashes = []
-        for i in range(self.hash_count):
-            hash_result = int(hashlib.md5(f"{item}{i}".encode()).hexdigest(), 16) % self.size
-            hashes.append(hash_result)
-        return hashes
+        """Returns the two base hashes for an item."""
+        if self.crypto_hash:
+            digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+            h1, h2 = int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little')
+        else:
+            h1, h2 = mmh3.hash64(item.encode(), signed=False)
+        return np.uint64(h1), np.uint64(h2)
 
     def add(self, item: str):
         """Adds an item to the filter."""
-        for hash_value in self._hashes(item):
-            self.bit_array[hash_value] = 1
+        h1, h2 = self._hashes(item)
+        bloom_add(self.blocks, h1, h2, self.hash_count)
+
+    def add_many(self, items: List[str]):
+        """Adds a stream of items to the filter."""
+        hashes = {item: self._hashes(item) for item in set(items)}
+        h1s = np.array([hashes[item][0] for item in items], dtype=np.uint64)
+        h2s = np.array([hashes[item][1] for item in items], dtype=np.uint64)
+        bloom_add_many(self.blocks, h1s, h2s, self.hash_count)
 
     def check(self, item: str) -> bool:
         """Checks if an item is possibly in the filter."""
-        return all(self.bit_array[hash_value] == 1 for hash_value in self._hashes(item))
+        h1, h2 = self._hashes(item)
+        return bool(bloom_check(self.blocks, h1, h2, self.hash_count))
 
 class AnomalyDetector:
     """A simple anomaly detector for rare feedback."""
     def __init__(self, rare_events: set):
-        self.rare_events = rare_events
-
-    def is_rare(self, feedback: str) -> bool:
-        return feedback in self.rare_events
+        self.rare_events = frozenset(rare_events)
+        # Bind the membership test directly to skip a Python-level call frame.
+        self.is_rare = self.rare_events.__contains__
 
 def apply_laplace_noise(value: int, epsilon: float) -> int:
     """Applies Laplace noise for differential privacy."""
     sensitivity = 1
     scale = sensitivity / epsilon
-    noise = np.random.laplace(loc=0, scale=scale)
+    noise = _RNG.laplace(0.0, scale)
     return int(value + noise)
 
-def calculate_utility(original_counts: collections.Counter, noisy_data: List[str]) -> Dict[str, Any]:
+def apply_laplace_noise_batch(values: np.ndarray, scale: float, rng: np.random.Generator) -> np.ndarray:
+    """Applies Laplace noise with a precomputed scale to an array of counts."""
+    noise = rng.laplace(0.0, scale, len(values))
+    return (values + noise).astype(int)
+
+def reserve_codes(buffer: np.ndarray, used: int, extra: int) -> np.ndarray:
+    """Returns a code buffer with room for extra more codes, growing it geometrically if needed."""
+    if used + extra <= len(buffer):
+        return buffer
+    grown = np.empty(max(used + extra, 2 * len(buffer)), dtype=buffer.dtype)
+    grown[:used] = buffer[:used]
+    return grown
+
+def calculate_utility_vec(orig_counts: np.ndarray, noisy_codes: np.ndarray, V: int) -> np.ndarray:
+    """Calculates the per-category relative error of integer-encoded privatized data."""
+    noisy_counts = np.bincount(noisy_codes, minlength=V)
+    # Categories with a count of zero have no defined relative error.
+    return np.where(orig_counts > 0, np.abs(orig_counts - noisy_counts) / np.maximum(orig_counts, 1), np.nan)
+
+def calculate_utility(original_counts: np.ndarray, noisy_codes: np.ndarray, vocab: list) -> Dict[str, Any]:
     """Calculates the utility (accuracy) of the privatized data."""
-    noisy_counts = collections.Counter(noisy_data)
+    errors = calculate_utility_vec(original_counts, noisy_codes, len(vocab))
+    noisy_counts = np.bincount(noisy_codes, minlength=len(vocab))
     
     accuracy = {}
-    for key, count in original_counts.items():
-        noisy_count = noisy_counts.get(key, 0)
-        if count > 0:
-            error = abs(count - noisy_count) / count
-        else:
-            error = "N/A"
-        accuracy[key] = {"original": count, "noisy": noisy_count, "relative_error": error}
+    for i, key in enumerate(vocab):
+        accuracy[key] = {"original": int(original_counts[i]), "noisy": int(noisy_counts[i]), "relative_error": float(errors[i])}
     
-    total_original = sum(original_counts.values())
-    total_noisy = len(noisy_data)
+    total_original = int(original_counts.sum())
+    total_noisy = len(noisy_codes)
     
     if total_original > 0:
         total_error = abs(total_original - total_noisy) / total_original
     else:
-        total_error = "N/A"
+        total_error = float("nan")
     
     return {"per_category_accuracy": accuracy, "total_relative_error": total_error}
 
@@ -84,76 +141,151 @@ class RAPPOR_Simulator:
     A simplified RAPPOR-like simulator.
     Applies uniform randomized response to all events.
     """
-    def __init__(self, epsilon: float, vocab: list):
+    def __init__(self, epsilon: float, vocab: list, expected_size: int = 0):
         self.epsilon = epsilon
         self.vocab = vocab
-        self.privatized_data = []
+        self.v2i = {v: i for i, v in enumerate(vocab)}
+        self.i2v = list(vocab)
+        self.p = np.exp(epsilon) / (np.exp(epsilon) + len(vocab) - 1)
+        # Privatized output is kept as integer codes in a preallocated buffer.
+        self.privatized_codes = np.empty(expected_size, dtype=np.min_scalar_type(max(len(vocab) - 1, 0)))
+        self._n = 0
 
     def privatize(self, feedback: str):
-        p = np.exp(self.epsilon) / (np.exp(self.epsilon) + len(self.vocab) - 1)
-        
-        if random.random() < p:
-            self.privatized_data.append(feedback)
+        code = self.v2i[feedback]
+        if _RNG.random() >= self.p:
+            offset = _RNG.integers(1, len(self.vocab))
+            code = (code + offset) % len(self.vocab)
+        self.privatized_codes = reserve_codes(self.privatized_codes, self._n, 1)
+        self.privatized_codes[self._n] = code
+        self._n += 1
+
+    def privatize_all(self, feedbacks: np.ndarray) -> np.ndarray:
+        """
+        Privatizes a batch of integer-encoded feedback in one vectorized pass.
+        Returns the privatized codes.
+        """
+        num_feedback = len(feedbacks)
+        num_values = len(self.vocab)
+        if num_values <= 1:
+            # With a single value there is nothing to flip to (p == 1).
+            out = feedbacks
         else:
-            other_values = [v for v in self.vocab if v != feedback]
-            self.privatized_data.append(random.choice(other_values))
+            truth = _RNG.random(num_feedback) < self.p
+            # A non-zero offset always lands on a value other than the true one.
+            rand_offsets = _RNG.integers(1, num_values, num_feedback)
+            out = np.where(truth, feedbacks, (feedbacks + rand_offsets) % num_values)
+        self.privatized_codes = reserve_codes(self.privatized_codes, self._n, num_feedback)
+        self.privatized_codes[self._n:self._n + num_feedback] = out
+        self._n += num_feedback
+        return out
+
+    @property
+    def privatized_data(self) -> List[str]:
+        """The privatized feedback decoded back to strings."""
+        return [self.i2v[c] for c in self.privatized_codes[:self._n]]
+
 
 class ALIGNDP_Algorithm:
     """
     Your ALIGNDP algorithm, applying DP only to rare events.
     """
-    def __init__(self, rare_events: set, epsilon_rare: float, regular_feedback_bloom_size: int, bloom_hash_count: int):
+    def __init__(self, rare_events: set, epsilon_rare: float, regular_feedback_bloom_size: int, bloom_hash_count: int, vocab: list, expected_size: int = 0):
         self.rare_events = rare_events
         self.epsilon_rare = epsilon_rare
+        self._laplace_scale = 1.0 / epsilon_rare
         self.detector = AnomalyDetector(rare_events)
-        self.privatized_data = []
+        self.vocab = vocab
+        self._vocab_array = np.array(vocab)
+        self.v2i = {v: i for i, v in enumerate(vocab)}
+        self.rare_codes = np.array([i for i, v in enumerate(vocab) if self.detector.is_rare(v)], dtype=int)
+        # Privatized output is kept as integer codes in a preallocated buffer.
+        self.privatized_codes = np.empty(expected_size, dtype=np.min_scalar_type(max(len(vocab) - 1, 0)))
+        self._n = 0
         self.regular_feedback_bloom = BloomFilter(regular_feedback_bloom_size, bloom_hash_count)
     
     def process_feedback(self, feedback: str):
         if self.detector.is_rare(feedback):
-            noisy_count = apply_laplace_noise(1, self.epsilon_rare)
-            for _ in range(max(0, noisy_count)):
-                self.privatized_data.append(feedback)
+            noisy_count = max(0, int(1 + _RNG.laplace(0.0, self._laplace_scale)))
+            self.privatized_codes = reserve_codes(self.privatized_codes, self._n, noisy_count)
+            self.privatized_codes[self._n:self._n + noisy_count] = self.v2i[feedback]
+            self._n += noisy_count
         else:
             self.regular_feedback_bloom.add(feedback)
-            self.privatized_data.append(feedback)
+            self.privatized_codes = reserve_codes(self.privatized_codes, self._n, 1)
+            self.privatized_codes[self._n] = self.v2i[feedback]
+            self._n += 1
+
+    def process_batch(self, codes: np.ndarray) -> np.ndarray:
+        """
+        Processes a batch of integer-encoded feedback at once.
+        Every rare event is noised individually, using one vectorized Laplace call.
+        Returns the privatized codes.
+        """
+        start = self._n
+        rare_mask = np.isin(codes, self.rare_codes)
+        regular = codes[~rare_mask]
+        self.regular_feedback_bloom.add_many(self._vocab_array[regular].tolist())
+
+        # Each rare event keeps its own noisy count, as in process_feedback, but all
+        # the noise comes from a single Laplace call before summing per category.
+        rare = codes[rare_mask]
+        event_counts = np.maximum(0, apply_laplace_noise_batch(np.ones(len(rare)), self._laplace_scale, _RNG))
+        noisy = np.bincount(rare, weights=event_counts, minlength=len(self.vocab))[self.rare_codes].astype(int)
+        self.privatized_codes = reserve_codes(self.privatized_codes, self._n, len(regular) + int(noisy.sum()))
+        self.privatized_codes[self._n:self._n + len(regular)] = regular
+        self._n += len(regular)
+        for code, noisy_count in zip(self.rare_codes, noisy):
+            self.privatized_codes[self._n:self._n + noisy_count] = code
+            self._n += noisy_count
+        return self.privatized_codes[start:self._n]
+
+    @property
+    def privatized_data(self) -> List[str]:
+        """The privatized feedback decoded back to strings."""
+        return self._vocab_array[self.privatized_codes[:self._n]].tolist()
+
 
 # --- Simulation and Comparison ---
 
-def simulate_llm_interaction(num_users: int) -> List[UserFeedback]:
-    """Simulates LLM chat interactions."""
-    feedback_types = ["dislike", "dislike", "dislike", "override", "override", "like"]
-    prompts = ["Tell me about machine learning.", "Write a poem about the sea."]
-    responses = ["Machine learning is a field of AI...", "The ocean breathes in tides of blue..."]
-    
-    feedback_data = []
-    for _ in range(num_users):
-        feedback = random.choice(feedback_types)
-        prompt = random.choice(prompts)
-        response = random.choice(responses)
-        feedback_data.append(UserFeedback(prompt, response, feedback))
-        
-    return feedback_data
+FEEDBACK_VOCAB = ["like", "dislike", "override"]
+FEEDBACK_WEIGHTS = [1 / 6, 3 / 6, 2 / 6]
+PROMPTS = ["Tell me about machine learning.", "Write a poem about the sea."]
+RESPONSES = ["Machine learning is a field of AI...", "The ocean breathes in tides of blue..."]
+
+def simulate_llm_interaction(num_users: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Simulates LLM chat interactions.
+    Returns parallel arrays of feedback codes into FEEDBACK_VOCAB,
+    prompt ids into PROMPTS and response ids into RESPONSES.
+    """
+    feedback_codes = _RNG.choice(len(FEEDBACK_VOCAB), size=num_users, p=FEEDBACK_WEIGHTS).astype(np.uint8)
+    prompt_ids = _RNG.integers(0, len(PROMPTS), num_users).astype(np.uint8)
+    response_ids = _RNG.integers(0, len(RESPONSES), num_users).astype(np.uint8)
+    return feedback_codes, prompt_ids, response_ids
+
+def count_feedback(codes: np.ndarray, vocab: list) -> collections.Counter:
+    """Counts integer-encoded feedback per category."""
+    counts = np.bincount(codes, minlength=len(vocab))
+    return collections.Counter({vocab[i]: int(c) for i, c in enumerate(counts) if c})
 
 def run_comparison(num_users: int, epsilon_to_test: float, rare_events: set):
     """
     Runs a comparison of the algorithms for a given epsilon.
     For ALIGNDP, this epsilon is used for the rare events.
     """
-    FEEDBACK_VOCAB = ["like", "dislike", "override"]
-
     print(f"--- Simulating LLM Feedback Data for {num_users} users ---")
-    data = simulate_llm_interaction(num_users)
-    original_feedback_counts = collections.Counter(f.feedback for f in data)
+    codes, _, _ = simulate_llm_interaction(num_users)
+    original_feedback_counts = count_feedback(codes, FEEDBACK_VOCAB)
+    original_counts = np.bincount(codes, minlength=len(FEEDBACK_VOCAB))
     print(f"Original Feedback Counts: {original_feedback_counts}")
     print(f"Epsilon for test: {epsilon_to_test}")
     print("-" * 40)
     
     # 1. RAPPOR-like comparison
-    rappor = RAPPOR_Simulator(epsilon=epsilon_to_test, vocab=FEEDBACK_VOCAB)
-    for f in data:
-        rappor.privatize(f.feedback)
-    rappor_utility = calculate_utility(original_feedback_counts, rappor.privatized_data)
+    rappor = RAPPOR_Simulator(epsilon=epsilon_to_test, vocab=FEEDBACK_VOCAB, expected_size=num_users)
+    rappor_codes = rappor.privatize_all(codes)
+    rappor_utility = calculate_utility(original_counts, rappor_codes, FEEDBACK_VOCAB)
     print("RAPPOR-like Results (Uniform LDP):")
     for key, val in rappor_utility['per_category_accuracy'].items():
         print(f"  - {key}: Original={val['original']}, Noisy={val['noisy']}, Error={val['relative_error']:.2f}")
@@ -165,11 +297,12 @@ def run_comparison(num_users: int, epsilon_to_test: float, rare_events: set):
         rare_events=rare_events,
         epsilon_rare=epsilon_to_test,
         regular_feedback_bloom_size=1000,
-        bloom_hash_count=5
+        bloom_hash_count=5,
+        vocab=FEEDBACK_VOCAB,
+        expected_size=num_users
     )
-    for f in data:
-        aligndp.process_feedback(f.feedback)
-    aligndp_utility = calculate_utility(original_feedback_counts, aligndp.privatized_data)
+    aligndp_codes = aligndp.process_batch(codes)
+    aligndp_utility = calculate_utility(original_counts, aligndp_codes, FEEDBACK_VOCAB)
     print("ALIGNDP Results (Selective DP):")
     for key, val in aligndp_utility['per_category_accuracy'].items():
         print(f"  - {key}: Original={val['original']}, Noisy={val['noisy']}, Error={val['relative_error']:.2f}")
@@ -1,52 +1,64 @@
 import numpy as np
 import collections
-import random
+from itertools import repeat
 import csv
-from typing import List, Dict, Any
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Any, Optional, Tuple
+
+# A single modern PCG64 generator shared by the whole module.
+_RNG = np.random.default_rng()
 
 # --- Helper Classes and Functions ---
 
 class AnomalyDetector:
     """A simple anomaly detector for rare feedback."""
     def __init__(self, rare_events: set):
-        self.rare_events = rare_events
-
-    def is_rare(self, feedback: str) -> bool:
-        return feedback in self.rare_events
+        self.rare_events = frozenset(rare_events)
+        # Bind the membership test directly to skip a Python-level call frame.
+        self.is_rare = self.rare_events.__contains__
 
 def apply_laplace_noise(value: int, epsilon: float) -> int:
     """Applies Laplace noise for differential privacy."""
     sensitivity = 1
     scale = sensitivity / epsilon
-    noise = np.random.laplace(loc=0, scale=scale)
+    noise = _RNG.laplace(0.0, scale)
     return int(value + noise)
 
-def calculate_utility(original_counts: collections.Counter, noisy_data: List[str]) -> Dict[str, Any]:
+def apply_laplace_noise_batch(values: np.ndarray, scale: float, rng: np.random.Generator) -> np.ndarray:
+    """Applies Laplace noise with a precomputed scale to an array of counts."""
+    noise = rng.laplace(0.0, scale, len(values))
+    return (values + noise).astype(int)
+
+def reserve_codes(buffer: np.ndarray, used: int, extra: int) -> np.ndarray:
+    """Returns a code buffer with room for extra more codes, growing it geometrically if needed."""
+    if used + extra <= len(buffer):
+        return buffer
+    grown = np.empty(max(used + extra, 2 * len(buffer)), dtype=buffer.dtype)
+    grown[:used] = buffer[:used]
+    return grown
+
+def calculate_utility_vec(orig_counts: np.ndarray, noisy_codes: np.ndarray, V: int) -> np.ndarray:
+    """Calculates the per-category relative error of integer-encoded privatized data."""
+    noisy_counts = np.bincount(noisy_codes, minlength=V)
+    # Categories with a count of zero have no defined relative error.
+    return np.where(orig_counts > 0, np.abs(orig_counts - noisy_counts) / np.maximum(orig_counts, 1), np.nan)
+
+def calculate_utility(original_counts: np.ndarray, noisy_codes: np.ndarray, vocab: list) -> Dict[str, Any]:
     """Calculates the utility (accuracy) of the privatized data."""
-    noisy_counts = collections.Counter(noisy_data)
+    errors = calculate_utility_vec(original_counts, noisy_codes, len(vocab))
+    noisy_counts = np.bincount(noisy_codes, minlength=len(vocab))
     
     accuracy = {}
-    # Use all keys from both original and noisy counts to cover all cases
-    all_keys = set(original_counts.keys()) | set(noisy_counts.keys())
-    
-    for key in sorted(all_keys):
-        original_count = original_counts.get(key, 0)
-        noisy_count = noisy_counts.get(key, 0)
-        
-        if original_count > 0:
-            error = abs(original_count - noisy_count) / original_count
-        else:
-            error = "N/A" # Handle cases where a category has a count of zero
-        
-        accuracy[key] = {"original": original_count, "noisy": noisy_count, "relative_error": error}
+    for i, key in enumerate(vocab):
+        accuracy[key] = {"original": int(original_counts[i]), "noisy": int(noisy_counts[i]), "relative_error": float(errors[i])}
     
-    total_original = sum(original_counts.values())
-    total_noisy = len(noisy_data)
+    total_original = int(original_counts.sum())
+    total_noisy = len(noisy_codes)
     
     if total_original > 0:
         total_error = abs(total_original - total_noisy) / total_original
     else:
-        total_error = "N/A"
+        total_error = float("nan")
     
     return {"per_category_accuracy": accuracy, "total_relative_error": total_error}
 
@@ -57,40 +69,112 @@ class RAPPOR_Simulator:
     A simplified RAPPOR-like simulator.
     Applies uniform randomized response to all events.
     """
-    def __init__(self, epsilon: float, vocab: list):
+    def __init__(self, epsilon: float, vocab: list, rng: Optional[np.random.Generator] = None, expected_size: int = 0):
         self.epsilon = epsilon
+        self.rng = rng if rng is not None else _RNG
         self.vocab = vocab
-        self.privatized_data = []
+        self.v2i = {v: i for i, v in enumerate(vocab)}
+        self.i2v = list(vocab)
+        self.p = np.exp(epsilon) / (np.exp(epsilon) + len(vocab) - 1)
+        # Privatized output is kept as integer codes in a preallocated buffer.
+        self.privatized_codes = np.empty(expected_size, dtype=np.min_scalar_type(max(len(vocab) - 1, 0)))
+        self._n = 0
 
     def privatize(self, feedback: str):
         # A simpler randomized response for a small vocabulary
-        p = np.exp(self.epsilon) / (np.exp(self.epsilon) + len(self.vocab) - 1)
-        
-        if random.random() < p:
-            self.privatized_data.append(feedback)
+        code = self.v2i[feedback]
+        if self.rng.random() >= self.p:
+            offset = self.rng.integers(1, len(self.vocab))
+            code = (code + offset) % len(self.vocab)
+        self.privatized_codes = reserve_codes(self.privatized_codes, self._n, 1)
+        self.privatized_codes[self._n] = code
+        self._n += 1
+
+    def privatize_all(self, feedbacks: np.ndarray) -> np.ndarray:
+        """
+        Privatizes a batch of integer-encoded feedback in one vectorized pass.
+        Returns the privatized codes.
+        """
+        num_feedback = len(feedbacks)
+        num_values = len(self.vocab)
+        if num_values <= 1:
+            # With a single value there is nothing to flip to (p == 1).
+            out = feedbacks
         else:
-            other_values = [v for v in self.vocab if v != feedback]
-            self.privatized_data.append(random.choice(other_values))
+            truth = self.rng.random(num_feedback) < self.p
+            # A non-zero offset always lands on a value other than the true one.
+            rand_offsets = self.rng.integers(1, num_values, num_feedback)
+            out = np.where(truth, feedbacks, (feedbacks + rand_offsets) % num_values)
+        self.privatized_codes = reserve_codes(self.privatized_codes, self._n, num_feedback)
+        self.privatized_codes[self._n:self._n + num_feedback] = out
+        self._n += num_feedback
+        return out
+
+    @property
+    def privatized_data(self) -> List[str]:
+        """The privatized feedback decoded back to strings."""
+        return [self.i2v[c] for c in self.privatized_codes[:self._n]]
+
 
 class ALIGNDP_Algorithm:
     """
     Your ALIGNDP algorithm, applying DP only to rare events.
     """
-    def __init__(self, rare_events: set, epsilon_rare: float):
+    def __init__(self, rare_events: set, epsilon_rare: float, vocab: list, rng: Optional[np.random.Generator] = None, expected_size: int = 0):
         self.rare_events = rare_events
+        self.rng = rng if rng is not None else _RNG
         self.epsilon_rare = epsilon_rare
+        self._laplace_scale = 1.0 / epsilon_rare
         self.detector = AnomalyDetector(rare_events)
-        self.privatized_data = []
+        self.vocab = vocab
+        self._vocab_array = np.array(vocab)
+        self.v2i = {v: i for i, v in enumerate(vocab)}
+        self.rare_codes = np.array([i for i, v in enumerate(vocab) if self.detector.is_rare(v)], dtype=int)
+        # Privatized output is kept as integer codes in a preallocated buffer.
+        self.privatized_codes = np.empty(expected_size, dtype=np.min_scalar_type(max(len(vocab) - 1, 0)))
+        self._n = 0
     
     def process_feedback(self, feedback: str):
         if self.detector.is_rare(feedback):
-            noisy_count = apply_laplace_noise(1, self.epsilon_rare)
+            noisy_count = max(0, int(1 + self.rng.laplace(0.0, self._laplace_scale)))
             # Add the rare event with noise to the list
-            for _ in range(max(0, noisy_count)):
-                self.privatized_data.append(feedback)
+            self.privatized_codes = reserve_codes(self.privatized_codes, self._n, noisy_count)
+            self.privatized_codes[self._n:self._n + noisy_count] = self.v2i[feedback]
+            self._n += noisy_count
         else:
             # Regular event: no DP.
-            self.privatized_data.append(feedback)
+            self.privatized_codes = reserve_codes(self.privatized_codes, self._n, 1)
+            self.privatized_codes[self._n] = self.v2i[feedback]
+            self._n += 1
+
+    def process_batch(self, codes: np.ndarray) -> np.ndarray:
+        """
+        Processes a batch of integer-encoded feedback at once.
+        Every rare event is noised individually, using one vectorized Laplace call.
+        Returns the privatized codes.
+        """
+        start = self._n
+        rare_mask = np.isin(codes, self.rare_codes)
+        regular = codes[~rare_mask]
+
+        # Each rare event keeps its own noisy count, as in process_feedback, but all
+        # the noise comes from a single Laplace call before summing per category.
+        rare = codes[rare_mask]
+        event_counts = np.maximum(0, apply_laplace_noise_batch(np.ones(len(rare)), self._laplace_scale, self.rng))
+        noisy = np.bincount(rare, weights=event_counts, minlength=len(self.vocab))[self.rare_codes].astype(int)
+        self.privatized_codes = reserve_codes(self.privatized_codes, self._n, len(regular) + int(noisy.sum()))
+        self.privatized_codes[self._n:self._n + len(regular)] = regular
+        self._n += len(regular)
+        for code, noisy_count in zip(self.rare_codes, noisy):
+            self.privatized_codes[self._n:self._n + noisy_count] = code
+            self._n += noisy_count
+        return self.privatized_codes[start:self._n]
+
+    @property
+    def privatized_data(self) -> List[str]:
+        """The privatized feedback decoded back to strings."""
+        return self._vocab_array[self.privatized_codes[:self._n]].tolist()
+
 
 # --- Data Loading from CSV ---
 
@@ -114,6 +198,16 @@ def load_feedback_data_from_csv(filename: str) -> List[str]:
         print(f"Error: The 'Feedback' column was not found in '{filename}'.")
         return []
 
+def encode_feedback(feedback_data: List[str], vocab: list) -> np.ndarray:
+    """Maps each feedback string to its integer code in the vocabulary."""
+    v2i = {v: i for i, v in enumerate(vocab)}
+    return np.array([v2i[f] for f in feedback_data])
+
+def count_feedback(codes: np.ndarray, vocab: list) -> collections.Counter:
+    """Counts integer-encoded feedback per category."""
+    counts = np.bincount(codes, minlength=len(vocab))
+    return collections.Counter({vocab[i]: int(c) for i, c in enumerate(counts) if c})
+
 # --- Experiment Runner ---
 
 def run_csv_comparison(filename: str, epsilon_to_test: float, rare_events: set):
@@ -129,18 +223,19 @@ def run_csv_comparison(filename: str, epsilon_to_test: float, rare_events: set):
         
     # The vocabulary must be a list of all possible feedback types in your data.
     # The code now uses the actual categories from your output.
-    FEEDBACK_VOCAB = list(set(feedback_data))
-    original_feedback_counts = collections.Counter(feedback_data)
+    FEEDBACK_VOCAB = sorted(set(feedback_data))
+    feedback_codes = encode_feedback(feedback_data, FEEDBACK_VOCAB)
+    original_feedback_counts = count_feedback(feedback_codes, FEEDBACK_VOCAB)
+    original_counts = np.bincount(feedback_codes, minlength=len(FEEDBACK_VOCAB))
     
     print(f"\nOriginal Feedback Counts: {original_feedback_counts}")
     print(f"Running comparison with epsilon = {epsilon_to_test}")
     print("-" * 40)
     
     # 1. RAPPOR-like comparison
-    rappor = RAPPOR_Simulator(epsilon=epsilon_to_test, vocab=FEEDBACK_VOCAB)
-    for f in feedback_data:
-        rappor.privatize(f)
-    rappor_utility = calculate_utility(original_feedback_counts, rappor.privatized_data)
+    rappor = RAPPOR_Simulator(epsilon=epsilon_to_test, vocab=FEEDBACK_VOCAB, expected_size=len(feedback_codes))
+    rappor_codes = rappor.privatize_all(feedback_codes)
+    rappor_utility = calculate_utility(original_counts, rappor_codes, FEEDBACK_VOCAB)
     print("RAPPOR-like Results (Uniform LDP):")
     for key, val in rappor_utility['per_category_accuracy'].items():
         print(f"  - {key}: Original={val['original']}, Noisy={val['noisy']}, Error={val['relative_error']:.2f}")
@@ -148,10 +243,10 @@ def run_csv_comparison(filename: str, epsilon_to_test: float, rare_events: set):
     print("-" * 40)
     
     # 2. ALIGNDP algorithm
-    aligndp = ALIGNDP_Algorithm(rare_events=rare_events, epsilon_rare=epsilon_to_test)
-    for f in feedback_data:
-        aligndp.process_feedback(f)
-    aligndp_utility = calculate_utility(original_feedback_counts, aligndp.privatized_data)
+    aligndp = ALIGNDP_Algorithm(rare_events=rare_events, epsilon_rare=epsilon_to_test, vocab=FEEDBACK_VOCAB,
+                                expected_size=len(feedback_codes))
+    aligndp_codes = aligndp.process_batch(feedback_codes)
+    aligndp_utility = calculate_utility(original_counts, aligndp_codes, FEEDBACK_VOCAB)
     print("ALIGNDP Results (Selective DP):")
     for key, val in aligndp_utility['per_category_accuracy'].items():
         print(f"  - {key}: Original={val['original']}, Noisy={val['noisy']}, Error={val['relative_error']:.2f}")
@@ -167,53 +262,72 @@ if __name__ == "__main__":
     
     run_csv_comparison(filename=FILENAME, epsilon_to_test=EPSILON_TEST, rare_events=RARE_EVENT_TYPES)
 '''
-def run_multiple_simulations(num_runs: int, filename: str, epsilon: float, rare_events: set):
-    rappor_total_errors = collections.defaultdict(list)
-    aligndp_total_errors = collections.defaultdict(list)
+def format_average_error(errors: np.ndarray) -> str:
+    """Formats the mean of the defined errors, or "N/A" if none are defined."""
+    if np.isnan(errors).all():
+        return "N/A"
+    return f"{np.nanmean(errors):.4f}"
+
+def single_run(seed, feedback_codes: np.ndarray, vocab: list, epsilon: float, rare_events: set) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Runs one RAPPOR and one ALIGNDP privatization pass with its own seeded generator.
+    Returns the relative error of each category followed by the total relative error
+    for both algorithms.
+    """
+    rng = np.random.default_rng(seed)
+    original_counts = np.bincount(feedback_codes, minlength=len(vocab))
+    total_original = original_counts.sum()
+    run_errors = []
+
+    rappor = RAPPOR_Simulator(epsilon=epsilon, vocab=vocab, rng=rng, expected_size=len(feedback_codes))
+    aligndp = ALIGNDP_Algorithm(rare_events=rare_events, epsilon_rare=epsilon, vocab=vocab, rng=rng,
+                                expected_size=len(feedback_codes))
+
+    for noisy_codes in (rappor.privatize_all(feedback_codes), aligndp.process_batch(feedback_codes)):
+        errors = calculate_utility_vec(original_counts, noisy_codes, len(vocab))
+        total_error = abs(total_original - len(noisy_codes)) / total_original
+        run_errors.append(np.append(errors, total_error))
+
+    return run_errors[0], run_errors[1]
 
+def run_multiple_simulations(num_runs: int, filename: str, epsilon: float, rare_events: set, seed: Optional[int] = None):
     print(f"\n--- Running {num_runs} simulations to get average results ---")
     
-    for i in range(num_runs):
-        feedback_data = load_feedback_data_from_csv(filename=filename)
-        
-        if not feedback_data:
-            print("Failed to load data. Aborting simulations.")
-            return
-
-        FEEDBACK_VOCAB = list(set(feedback_data))
-        original_counts = collections.Counter(feedback_data)
-
-        # RAPPOR Simulation
-        rappor = RAPPOR_Simulator(epsilon=epsilon, vocab=FEEDBACK_VOCAB)
-        for f in feedback_data:
-            rappor.privatize(f)
-        rappor_utility = calculate_utility(original_counts, rappor.privatized_data)
-        for key, val in rappor_utility['per_category_accuracy'].items():
-            rappor_total_errors[key].append(val['relative_error'])
-        rappor_total_errors['total'].append(rappor_utility['total_relative_error'])
-
-        # ALIGNDP Simulation
-        aligndp = ALIGNDP_Algorithm(rare_events=rare_events, epsilon_rare=epsilon)
-        for f in feedback_data:
-            aligndp.process_feedback(f)
-        aligndp_utility = calculate_utility(original_counts, aligndp.privatized_data)
-        for key, val in aligndp_utility['per_category_accuracy'].items():
-            aligndp_total_errors[key].append(val['relative_error'])
-        aligndp_total_errors['total'].append(aligndp_utility['total_relative_error'])
+    # The data is identical across runs, so load and encode it only once.
+    feedback_data = load_feedback_data_from_csv(filename=filename)
+    
+    if not feedback_data:
+        print("Failed to load data. Aborting simulations.")
+        return
+
+    FEEDBACK_VOCAB = sorted(set(feedback_data))
+    feedback_codes = encode_feedback(feedback_data, FEEDBACK_VOCAB)
+
+    # One row per run: the error of each category followed by the total error.
+    # NaN marks an undefined error.
+    rappor_total_errors = np.full((num_runs, len(FEEDBACK_VOCAB) + 1), np.nan)
+    aligndp_total_errors = np.full((num_runs, len(FEEDBACK_VOCAB) + 1), np.nan)
+
+    # Runs are independent, so each gets its own seed and can execute in parallel.
+    seeds = np.random.SeedSequence(seed).spawn(num_runs)
+    with ProcessPoolExecutor() as executor:
+        results = executor.map(single_run, seeds, repeat(feedback_codes), repeat(FEEDBACK_VOCAB),
+                               repeat(epsilon), repeat(rare_events))
+        for i, (rappor_errors, aligndp_errors) in enumerate(results):
+            rappor_total_errors[i] = rappor_errors
+            aligndp_total_errors[i] = aligndp_errors
 
     print("\n--- Average Results over {} runs ---".format(num_runs))
     
     print("RAPPOR-like (Uniform LDP) Average Errors:")
-    for key, errors in rappor_total_errors.items():
-        if key != 'total':
-            print(f"  - {key}: {np.mean([e for e in errors if e != 'N/A']):.4f}")
-    print(f"  Total Average Error: {np.mean([e for e in rappor_total_errors['total'] if e != 'N/A']):.4f}")
+    for key, errors in zip(FEEDBACK_VOCAB, rappor_total_errors.T):
+        print(f"  - {key}: {format_average_error(errors)}")
+    print(f"  Total Average Error: {format_average_error(rappor_total_errors[:, -1])}")
     
     print("\nALIGNDP (Selective DP) Average Errors:")
-    for key, errors in aligndp_total_errors.items():
-        if key != 'total':
-            print(f"  - {key}: {np.mean([e for e in errors if e != 'N/A']):.4f}")
-    print(f"  Total Average Error: {np.mean([e for e in aligndp_total_errors['total'] if e != 'N/A']):.4f}")
+    for key, errors in zip(FEEDBACK_VOCAB, aligndp_total_errors.T):
+        print(f"  - {key}: {format_average_error(errors)}")
+    print(f"  Total Average Error: {format_average_error(aligndp_total_errors[:, -1])}")
 
 # Update the main block to call the new function
 if __name__ == "__main__":
@@ -1,8 +1,10 @@
 import numpy as np
 import collections
-import random
 from typing import List, Dict, Any
 
+# A single modern PCG64 generator shared by the whole module.
+_RNG = np.random.default_rng()
+
 # --- Step 1: Data Model ---
 class UserFeedback:
     """Represents a single user feedback event."""
@@ -15,16 +17,15 @@ class UserFeedback:
 class AnomalyDetector:
     """A simple anomaly detector for rare feedback."""
     def __init__(self, rare_events: set):
-        self.rare_events = rare_events
-
-    def is_rare(self, feedback: str) -> bool:
-        return feedback in self.rare_events
+        self.rare_events = frozenset(rare_events)
+        # Bind the membership test directly to skip a Python-level call frame.
+        self.is_rare = self.rare_events.__contains__
 
 def apply_laplace_noise(value: int, epsilon: float) -> int:
     """Applies Laplace noise for differential privacy."""
     sensitivity = 1  # For a simple counting query
     scale = sensitivity / epsilon
-    noise = np.random.laplace(loc=0, scale=scale)
+    noise = _RNG.laplace(0.0, scale)
     return int(value + noise)
 
 # --- Step 3: Implement Privacy Algorithms ---
@@ -36,13 +37,14 @@ class RAPPOR_Simulator:
     """
     def __init__(self, epsilon: float):
         self.epsilon = epsilon
+        self.flip_probability = 1 / (np.exp(epsilon) + 1)
         self.privatized_data = []
 
     def privatize(self, feedback: str):
         # A simple randomized response:
         # with probability 1/(e^epsilon + 1) we flip the bit
         # This is a very simplified version for demonstration
-        if random.random() < 1 / (np.exp(self.epsilon) + 1):
+        if _RNG.random() < self.flip_probability:
             # "Noisy" flip - simulate an inaccurate report
             flipped_feedback = "dislike" if feedback == "like" else "like"
             self.privatized_data.append(flipped_feedback)
@@ -58,20 +60,21 @@ class Apple_Privacy_Simulator:
     def __init__(self, epsilon: float, vocab: list):
         self.epsilon = epsilon
         self.vocab = vocab
+        self.v2i = {v: i for i, v in enumerate(vocab)}
+        self.i2v = list(vocab)
+        self.p = np.exp(epsilon) / (np.exp(epsilon) + len(vocab) - 1)
+        self.q = 1 / (np.exp(epsilon) + len(vocab) - 1)
         self.privatized_data = []
 
     def privatize(self, feedback: str):
         # A simplified randomized response mechanism
-        p = np.exp(self.epsilon) / (np.exp(self.epsilon) + len(self.vocab) - 1)
-        q = 1 / (np.exp(self.epsilon) + len(self.vocab) - 1)
-
-        if random.random() < p:
+        if _RNG.random() < self.p:
             # Report truthfully
             self.privatized_data.append(feedback)
         else:
             # Report a random value from the vocab (excluding the true value)
-            other_values = [v for v in self.vocab if v != feedback]
-            self.privatized_data.append(random.choice(other_values))
+            offset = _RNG.integers(1, len(self.vocab))
+            self.privatized_data.append(self.i2v[(self.v2i[feedback] + offset) % len(self.vocab)])
 
 class ALIGNDP_Algorithm:
     """
@@ -133,9 +136,9 @@ def simulate_llm_interaction(num_users: int) -> List[UserFeedback]:
     
     feedback_data = []
     for _ in range(num_users):
-        feedback = random.choice(feedback_types)
-        prompt = random.choice(prompts)
-        response = random.choice(responses)
+        feedback = feedback_types[_RNG.integers(len(feedback_types))]
+        prompt = prompts[_RNG.integers(len(prompts))]
+        response = responses[_RNG.integers(len(responses))]
         feedback_data.append(UserFeedback(prompt, response, feedback))
         
     return feedback_data